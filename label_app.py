@@ -17,9 +17,23 @@ Date: 2025
 
 import streamlit as st
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import io
 import os
+import threading
+import unicodedata
 from typing import Optional
 
+# Filtered views share memory with the uploaded data until they are written to
+# (always the case from pandas 3.0 on, where the option is deprecated)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
 # Page configuration
 st.set_page_config(
     page_title="YouTube Comment Labeler",
@@ -30,37 +44,155 @@ st.set_page_config(
 # Constants
 LABEL_OPTIONS = [1, 2, 3]
 OUTPUT_FILE = "labeled_comments.csv"
+LOG_FILE = "labeled_comments.ndjson"
+LOG_COMPACT_BYTES = 4 << 20
+LABEL_KEYS = ['videoId', 'text_original']
+TEXT_ID_COLUMN = '_tid'
+MATCH_KEYS = ['videoId', TEXT_ID_COLUMN]
+COMMENTS_DTYPES = {
+    'videoId': pa.string(),
+    'text_original': pa.string(),
+}
+VIDEOS_DTYPES = {
+    'videoId': pa.string(),
+    'frame': pa.int32(),
+}
+PANDAS_DTYPES = {
+    pa.string(): pd.StringDtype('pyarrow'),
+    pa.int32(): pd.Int32Dtype(),
+}
+VIDEO_COLUMNS = ['videoId', 'frame']
+
+
+def add_text_ids(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add a 64-bit hash of the normalized comment text used as a join key.
+    
+    The text is stripped and NFC-normalized before hashing, so the same
+    comment matches regardless of surrounding whitespace or Unicode form.
+    The original text is left untouched for display and saving.
+    
+    Args:
+        df: DataFrame with a 'text_original' column
+    
+    Returns:
+        DataFrame with an added uint64 TEXT_ID_COLUMN, or df unchanged if it
+        has no 'text_original' column
+    """
+    if 'text_original' not in df.columns:
+        return df
+    digests = b''.join(
+        hashlib.blake2b(unicodedata.normalize('NFC', text.strip()).encode(), digest_size=8).digest()
+        for text in df['text_original'].fillna('').astype(str)
+    )
+    return df.assign(**{TEXT_ID_COLUMN: np.frombuffer(digests, dtype=np.uint64)})
 
 
-def load_csv_file(uploaded_file) -> Optional[pd.DataFrame]:
+@st.cache_data(
+    show_spinner=False,
+    max_entries=4,
+    hash_funcs={bytes: lambda b: hashlib.blake2b(b, digest_size=16).digest()}
+)
+def load_csv_file(file_bytes: bytes, name: str,
+                  dtype: Optional[dict] = None,
+                  usecols: Optional[list] = None) -> Optional[pd.DataFrame]:
     """
-    Load a CSV file from Streamlit file uploader.
+    Load a CSV file from the raw bytes of a Streamlit upload.
+    
+    The result is cached on the file contents, so the CSV is only parsed
+    once per upload instead of on every rerun. Parsing uses PyArrow's
+    multithreaded CSV reader. Only the given columns are typed; every
+    other column is read as a string so it is written back out unchanged.
+    Dtypes and usecols are only applied to columns present in the header,
+    so missing columns are left for the caller to report. Only empty cells
+    are treated as missing.
     
     Args:
-        uploaded_file: Streamlit UploadedFile object
+        file_bytes: Contents of the uploaded file
+        name: Name of the uploaded file
+        dtype: Arrow types for the typed columns (optional)
+        usecols: Columns to read (optional, defaults to all columns)
     
     Returns:
         DataFrame if successful, None otherwise
     """
     try:
-        df = pd.read_csv(uploaded_file)
-        return df
+        header = pd.read_csv(io.BytesIO(file_bytes), nrows=0).columns
+        dtype = dtype or {}
+        column_types = {col: dtype.get(col, pa.string()) for col in header}
+        include_columns = [col for col in usecols if col in header] if usecols is not None else []
+        
+        # Column types go straight to Arrow's reader so untyped columns are
+        # never inferred (e.g. ISO dates stay the original text)
+        table = pacsv.read_csv(
+            io.BytesIO(file_bytes),
+            convert_options=pacsv.ConvertOptions(
+                column_types=column_types,
+                include_columns=include_columns,
+                null_values=[''],
+                strings_can_be_null=True
+            )
+        )
+        df = table.to_pandas(types_mapper=PANDAS_DTYPES.get)
+        return add_text_ids(df)
     except Exception as e:
-        st.error(f"Error loading file: {e}")
+        st.error(f"Error loading file '{name}': {e}")
         return None
 
 
-def load_existing_labels() -> Optional[pd.DataFrame]:
+def get_labels_mtime() -> Optional[float]:
+    """
+    Get the latest modification time of the output file and the label log.
+    
+    Returns:
+        Modification time or None if neither file exists
+    """
+    mtimes = [os.path.getmtime(path) for path in (OUTPUT_FILE, LOG_FILE) if os.path.exists(path)]
+    return max(mtimes) if mtimes else None
+
+
+def read_labels_files() -> Optional[pd.DataFrame]:
     """
-    Load existing labeled data if the output file exists.
+    Read the compacted output file and replay the label log on top of it.
     
     Returns:
-        DataFrame with existing labels or None if file doesn't exist
+        DataFrame with the current labels or None if neither file exists
     """
+    # Every column is read back as the text that was written, so columns
+    # passed through from the upload are never reinterpreted
+    frames = []
     if os.path.exists(OUTPUT_FILE):
+        frames.append(pd.read_csv(OUTPUT_FILE, dtype=str, keep_default_na=False, na_values=['']))
+    if os.path.exists(LOG_FILE):
+        frames.append(pd.read_json(LOG_FILE, lines=True, dtype=False, convert_dates=False))
+    if not frames:
+        return None
+    
+    df = add_text_ids(pd.concat(frames, ignore_index=True))
+    df['label'] = pd.to_numeric(df['label'])
+    # Later log entries win; entries with an empty label record a cleared label.
+    # Rows are deduplicated on the raw text so comments that only normalize to
+    # the same text id keep their own labels
+    df = df.drop_duplicates(subset=LABEL_KEYS, keep='last')
+    df = df[df['label'].notna()].reset_index(drop=True)
+    return df.astype({'label': 'Int8'})
+
+
+@st.cache_data(ttl=None, show_spinner=False, max_entries=1)
+def load_existing_labels(mtime: Optional[float]) -> Optional[pd.DataFrame]:
+    """
+    Load existing labeled data if the output file or label log exists.
+    
+    Args:
+        mtime: Latest modification time of the label files, used to
+            invalidate the cache whenever they change
+    
+    Returns:
+        DataFrame with existing labels or None if no labels were saved yet
+    """
+    if mtime is not None:
         try:
-            df = pd.read_csv(OUTPUT_FILE)
-            return df
+            return read_labels_files()
         except Exception as e:
             st.warning(f"Could not load existing labels: {e}")
             return None
@@ -69,7 +201,7 @@ def load_existing_labels() -> Optional[pd.DataFrame]:
 
 def save_labeled_data(df: pd.DataFrame) -> bool:
     """
-    Save the labeled data to a CSV file.
+    Save the labeled data to a CSV file using PyArrow's CSV writer.
     
     Args:
         df: DataFrame containing labeled comments
@@ -78,44 +210,134 @@ def save_labeled_data(df: pd.DataFrame) -> bool:
         True if successful, False otherwise
     """
     try:
-        df.to_csv(OUTPUT_FILE, index=False)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pacsv.write_csv(table, OUTPUT_FILE, write_options=pacsv.WriteOptions(include_header=True))
         return True
     except Exception as e:
         st.error(f"Error saving file: {e}")
         return False
 
 
-def get_video_ids(videos_df: pd.DataFrame) -> list:
+def compact() -> bool:
+    """
+    Fold the label log into the output file and remove the log.
+    
+    Returns:
+        True if successful, False otherwise
+    """
+    try:
+        df = read_labels_files()
+    except Exception as e:
+        st.error(f"Error reading labels for compaction: {e}")
+        return False
+    
+    if df is None or not os.path.exists(LOG_FILE):
+        return True
+    if not save_labeled_data(df.drop(columns=TEXT_ID_COLUMN)):
+        return False
+    os.remove(LOG_FILE)
+    return True
+
+
+def flush_delta(delta_df: pd.DataFrame) -> bool:
+    """
+    Append changed labels to the label log instead of rewriting the output file.
+    
+    The log is compacted into the output file once it grows past
+    LOG_COMPACT_BYTES.
+    
+    Args:
+        delta_df: DataFrame containing the comments whose label changed
+    
+    Returns:
+        True if successful, False otherwise
+    """
+    try:
+        delta_df.drop(columns=TEXT_ID_COLUMN, errors='ignore').to_json(
+            LOG_FILE, orient='records', lines=True, mode='a', date_format='iso'
+        )
+    except Exception as e:
+        st.error(f"Error saving file: {e}")
+        return False
+    
+    if os.path.getsize(LOG_FILE) > LOG_COMPACT_BYTES:
+        return compact()
+    return True
+
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def get_video_ids(_videos_df: pd.DataFrame, upload_key: str) -> list:
     """
     Extract unique video IDs from the videos DataFrame.
     
     Args:
-        videos_df: DataFrame containing video information
+        _videos_df: DataFrame containing video information (not hashed by
+            Streamlit; the cache is keyed on upload_key instead)
+        upload_key: Identifier of the uploaded videos file
     
     Returns:
         List of unique video IDs
     """
-    if 'videoId' in videos_df.columns:
-        return sorted(videos_df['videoId'].unique().tolist())
+    if 'videoId' in _videos_df.columns:
+        values = pd.unique(_videos_df['videoId'].values)
+        return values[values.argsort()].tolist()
     return []
 
 
-def get_frames(videos_df: pd.DataFrame) -> list:
+@st.cache_data(show_spinner=False, max_entries=2)
+def get_frames(_videos_df: pd.DataFrame, upload_key: str) -> list:
     """
     Extract unique frames from the videos DataFrame.
     
     Args:
-        videos_df: DataFrame containing video information
+        _videos_df: DataFrame containing video information (not hashed by
+            Streamlit; the cache is keyed on upload_key instead)
+        upload_key: Identifier of the uploaded videos file
     
     Returns:
         List of unique frames
     """
-    if 'frame' in videos_df.columns:
-        return sorted(videos_df['frame'].unique().tolist())
+    if 'frame' in _videos_df.columns:
+        values = pd.unique(_videos_df['frame'].dropna().values)
+        return values[values.argsort()].tolist()
     return []
 
 
-def filter_comments(comments_df: pd.DataFrame, video_id: str, 
+@st.cache_data(show_spinner=False, max_entries=2)
+def build_indexes(_comments_df: pd.DataFrame, _videos_df: Optional[pd.DataFrame],
+                  upload_key: tuple) -> tuple:
+    """
+    Build lookup indexes used to filter comments without rescanning.
+    
+    The indexes hold row positions, so the cache is keyed on the identity of
+    the uploads rather than on a (sampled) hash of the DataFrames.
+    
+    Args:
+        _comments_df: DataFrame containing comments (not hashed by Streamlit)
+        _videos_df: DataFrame containing video information (optional, not
+            hashed by Streamlit)
+        upload_key: Identifiers of the uploaded comments and videos files
+    
+    Returns:
+        Tuple of (videoId -> comment row positions, frame -> set of videoIds)
+    """
+    vid_to_rows = {
+        video_id: np.asarray(rows)
+        for video_id, rows in _comments_df.groupby('videoId', sort=False).indices.items()
+    }
+    
+    frame_to_vids = {}
+    if _videos_df is not None:
+        video_ids = _videos_df['videoId'].to_numpy()
+        frame_to_vids = {
+            int(frame): frozenset(video_ids[rows])
+            for frame, rows in _videos_df.groupby('frame', sort=False).indices.items()
+        }
+    
+    return vid_to_rows, frame_to_vids
+
+
+def filter_comments(comments_df: pd.DataFrame, video_id: str, upload_key: tuple,
                    videos_df: Optional[pd.DataFrame] = None, 
                    frame: Optional[int] = None) -> pd.DataFrame:
     """
@@ -124,58 +346,130 @@ def filter_comments(comments_df: pd.DataFrame, video_id: str,
     Args:
         comments_df: DataFrame containing comments
         video_id: Video ID to filter by
+        upload_key: Identifiers of the uploaded comments and videos files
         videos_df: DataFrame containing video information (optional)
         frame: Frame number to filter by (optional)
     
     Returns:
         Filtered DataFrame
     """
+    vid_to_rows, frame_to_vids = build_indexes(comments_df, videos_df, upload_key)
+    
     # Filter by video ID
-    filtered = comments_df[comments_df['videoId'] == video_id].copy()
+    rows = vid_to_rows.get(video_id, np.empty(0, dtype=np.intp))
     
     # If frame filter is specified and videos_df is provided
     if frame is not None and videos_df is not None:
-        # Get video IDs that match the selected frame
-        matching_videos = videos_df[videos_df['frame'] == frame]['videoId'].unique()
-        # Further filter comments to only those videos
-        filtered = filtered[filtered['videoId'].isin(matching_videos)]
+        # All selected rows share one videoId, so they either all match
+        # the frame or none of them do
+        if video_id not in frame_to_vids.get(int(frame), frozenset()):
+            rows = rows[:0]
     
-    return filtered
+    # Comments of one video are usually stored together; a contiguous block
+    # is returned as a slice that shares memory instead of a gathered copy
+    if len(rows) > 0 and rows[-1] - rows[0] + 1 == len(rows):
+        return comments_df.iloc[rows[0]:rows[-1] + 1]
+    return comments_df.take(rows)
+
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def indexed_labels(_existing_labels: pd.DataFrame, mtime: Optional[float]) -> tuple:
+    """
+    Index existing labels by (videoId, text id).
+    
+    Args:
+        _existing_labels: DataFrame containing previously labeled data
+            (not hashed by Streamlit; the cache is keyed on mtime instead)
+        mtime: Latest modification time of the label files
+    
+    Returns:
+        Tuple of (labels indexed by (videoId, text id), labels indexed by
+        (videoId, text_original)). The first index is unique; when several
+        saved comments share a text id the last label wins there, and the
+        second Series holds those comments by their exact text.
+    """
+    labels = _existing_labels.set_index(MATCH_KEYS)['label']
+    shared = labels.index.duplicated(keep=False)
+    exact = _existing_labels[shared].set_index(LABEL_KEYS)['label']
+    return labels[~labels.index.duplicated(keep='last')], exact
+
+
+def empty_labels(n: int) -> pd.arrays.IntegerArray:
+    """
+    Allocate an all-NA nullable Int8 label array.
+    
+    Args:
+        n: Number of labels
+    
+    Returns:
+        IntegerArray of length n with every value masked out
+    """
+    return pd.arrays.IntegerArray(np.zeros(n, dtype=np.int8), np.ones(n, dtype=bool))
 
 
 def merge_with_existing_labels(comments_df: pd.DataFrame, 
-                               existing_labels: Optional[pd.DataFrame]) -> pd.DataFrame:
+                               existing_labels: Optional[pd.DataFrame],
+                               labels_mtime: Optional[float] = None) -> pd.DataFrame:
     """
     Merge current comments with existing labels if available.
     
     Args:
         comments_df: DataFrame containing comments to label
         existing_labels: DataFrame containing previously labeled data
+        labels_mtime: Latest modification time of the label files (optional)
     
     Returns:
-        Merged DataFrame with existing labels
+        Merged DataFrame with existing labels in a nullable Int8 'label' column
     """
     if existing_labels is None or existing_labels.empty:
         # Add empty label column
-        comments_df['label'] = None
+        comments_df['label'] = empty_labels(len(comments_df))
         return comments_df
     
-    # Create a unique identifier for merging (assuming we can use all original columns)
-    # For simplicity, we'll try to match on text_original and videoId if both exist
+    # Match on videoId and the hashed text_original if both sides have the text
     if 'text_original' in comments_df.columns and 'text_original' in existing_labels.columns:
-        # Merge on text_original and videoId to preserve existing labels
-        result = comments_df.merge(
-            existing_labels[['text_original', 'videoId', 'label']],
-            on=['text_original', 'videoId'],
-            how='left',
-            suffixes=('', '_existing')
-        )
-        return result
+        labels, exact = indexed_labels(existing_labels, labels_mtime)
+        keys = pd.MultiIndex.from_arrays([comments_df[key].values for key in MATCH_KEYS])
+        result = labels.reindex(keys).astype('Int8')
+        
+        # Comments whose text id is shared by several saved comments take
+        # the label saved for their exact text when there is one
+        if not exact.empty:
+            exact_keys = pd.MultiIndex.from_arrays([comments_df[key].values for key in LABEL_KEYS])
+            exact_result = exact.reindex(exact_keys).astype('Int8')
+            result = pd.Series(exact_result.values).fillna(pd.Series(result.values))
+        
+        comments_df['label'] = result.values
+        return comments_df
     else:
-        comments_df['label'] = None
+        comments_df['label'] = empty_labels(len(comments_df))
         return comments_df
 
 
+@st.cache_data(show_spinner=False, max_entries=16)
+def compute_counts(_filtered_comments: pd.DataFrame, upload_key: tuple, video_id: str,
+                   frame: Optional[int], label_filter: str,
+                   labels_mtime: Optional[float]) -> tuple:
+    """
+    Count total, labeled and unlabeled comments in the current view.
+    
+    Args:
+        _filtered_comments: DataFrame shown in the labeling table (not hashed
+            by Streamlit; the cache is keyed on the remaining arguments)
+        upload_key: Identifiers of the uploaded comments and videos files
+        video_id: Selected video ID
+        frame: Selected frame or None
+        label_filter: Selected label status filter
+        labels_mtime: Latest modification time of the label files
+    
+    Returns:
+        Tuple of (total, labeled, unlabeled) counts
+    """
+    total = len(_filtered_comments)
+    labeled = int(_filtered_comments['label'].notna().sum())
+    return total, labeled, total - labeled
+
+
 def main():
     """Main application function."""
     
@@ -209,15 +503,27 @@ def main():
     )
     
     # Load existing labels if available
-    existing_labels = load_existing_labels()
+    labels_mtime = get_labels_mtime()
+    existing_labels = load_existing_labels(labels_mtime)
     if existing_labels is not None:
         st.sidebar.success(f"✅ Loaded {len(existing_labels)} existing labels")
     
     # Main content area
     if comments_file is not None and videos_file is not None:
-        # Load the CSV files
-        comments_df = load_csv_file(comments_file)
-        videos_df = load_csv_file(videos_file)
+        # Load the CSV files concurrently; worker threads get the script run
+        # context so cache lookups and error messages reach this session
+        ctx = get_script_run_ctx()
+        with ThreadPoolExecutor(
+            max_workers=2,
+            initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)
+        ) as executor:
+            comments_future = executor.submit(
+                load_csv_file, comments_file.getvalue(), comments_file.name, COMMENTS_DTYPES
+            )
+            videos_future = executor.submit(
+                load_csv_file, videos_file.getvalue(), videos_file.name, VIDEOS_DTYPES, VIDEO_COLUMNS
+            )
+            comments_df, videos_df = comments_future.result(), videos_future.result()
         
         if comments_df is not None and videos_df is not None:
             # Validate required columns
@@ -240,7 +546,10 @@ def main():
             st.sidebar.write(f"Total videos: {len(videos_df)}")
             
             # Get unique video IDs
-            video_ids = get_video_ids(videos_df)
+            # Cached lookups are keyed on the upload identity; row positions
+            # must never be reused across different files of the same shape
+            upload_key = (comments_file.file_id, videos_file.file_id)
+            video_ids = get_video_ids(videos_df, videos_file.file_id)
             
             if not video_ids:
                 st.error("No video IDs found in the videos CSV")
@@ -256,7 +565,7 @@ def main():
             )
             
             # Frame filter (optional)
-            frames = get_frames(videos_df)
+            frames = get_frames(videos_df, videos_file.file_id)
             use_frame_filter = st.sidebar.checkbox("Filter by Frame", value=False)
             selected_frame = None
             
@@ -280,41 +589,57 @@ def main():
             filtered_comments = filter_comments(
                 comments_df, 
                 selected_video, 
-                videos_df if use_frame_filter else None,
+                upload_key,
+                videos_df,
                 selected_frame
             )
             
             # Merge with existing labels
-            filtered_comments = merge_with_existing_labels(filtered_comments, existing_labels)
+            filtered_comments = merge_with_existing_labels(
+                filtered_comments, existing_labels, labels_mtime
+            )
             
             # Apply label status filter
+            # Masks come straight from the label array's validity mask, skipping Series overhead
             if label_filter == "Unlabeled Only":
-                filtered_comments = filtered_comments[filtered_comments['label'].isna()]
+                filtered_comments = filtered_comments[filtered_comments['label'].array.isna()]
             elif label_filter == "Labeled Only":
-                filtered_comments = filtered_comments[filtered_comments['label'].notna()]
+                filtered_comments = filtered_comments[~filtered_comments['label'].array.isna()]
             
             # Display statistics
             st.markdown("---")
             col1, col2, col3, col4 = st.columns(4)
             
+            total_count, labeled_count, unlabeled_count = compute_counts(
+                filtered_comments,
+                upload_key,
+                selected_video,
+                selected_frame,
+                label_filter,
+                labels_mtime
+            )
+            
             with col1:
-                st.metric("Total Comments", len(filtered_comments))
+                st.metric("Total Comments", total_count)
             
             with col2:
-                labeled_count = filtered_comments['label'].notna().sum()
                 st.metric("Labeled", labeled_count)
             
             with col3:
-                unlabeled_count = filtered_comments['label'].isna().sum()
                 st.metric("Unlabeled", unlabeled_count)
             
             with col4:
-                if len(filtered_comments) > 0:
-                    progress_pct = (labeled_count / len(filtered_comments)) * 100
+                if total_count > 0:
+                    progress_pct = (labeled_count / total_count) * 100
                     st.metric("Progress", f"{progress_pct:.1f}%")
                 else:
                     st.metric("Progress", "0%")
             
+            # Show the result of a save or compaction from before the rerun,
+            # even if the view is now empty
+            if 'save_message' in st.session_state:
+                st.success(st.session_state.pop('save_message'))
+            
             # Labeling interface
             if len(filtered_comments) == 0:
                 st.info("ℹ️ No comments found for the selected filters")
@@ -322,85 +647,55 @@ def main():
                 st.markdown("---")
                 st.subheader("📝 Label Comments")
                 
-                # Initialize session state for labels if not exists
-                if 'labels' not in st.session_state:
-                    st.session_state.labels = {}
-                
-                # Display each comment with labeling option
-                for idx, row in filtered_comments.iterrows():
-                    with st.container():
-                        st.markdown(f"**Comment #{idx}**")
-                        st.text_area(
-                            label="Comment Text",
-                            value=row['text_original'],
-                            height=100,
-                            disabled=True,
-                            key=f"text_{idx}"
-                        )
-                        
-                        # Get existing label or default
-                        existing_label = row.get('label', None)
-                        if pd.notna(existing_label):
-                            existing_label = int(existing_label)
-                            default_index = LABEL_OPTIONS.index(existing_label)
-                        else:
-                            default_index = 0
-                        
-                        # Label selection
-                        label = st.radio(
-                            "Select Label:",
-                            options=LABEL_OPTIONS,
-                            index=default_index,
-                            horizontal=True,
-                            key=f"label_{idx}"
-                        )
-                        
-                        # Store label in session state
-                        st.session_state.labels[idx] = label
-                        
-                        # Update the dataframe
-                        filtered_comments.at[idx, 'label'] = label
-                        
-                        st.markdown("---")
+                # Edit all labels in a single table instead of one widget per comment.
+                # The key changes with the view and after each save so pending
+                # edits are never applied to a different set of rows.
+                labels = filtered_comments['label']
+                edited = st.data_editor(
+                    filtered_comments[['videoId', 'text_original']].assign(label=labels),
+                    column_config={
+                        'videoId': st.column_config.TextColumn("Video ID", disabled=True),
+                        'text_original': st.column_config.TextColumn("Comment Text", disabled=True, width="large"),
+                        'label': st.column_config.SelectboxColumn("Label", options=LABEL_OPTIONS, required=False),
+                    },
+                    hide_index=False,
+                    num_rows="fixed",
+                    key=f"editor_{selected_video}_{selected_frame}_{label_filter}_{labels_mtime}"
+                )
                 
                 # Save button
                 st.markdown("### 💾 Save Labeled Data")
+                
                 col1, col2 = st.columns([1, 4])
                 
                 with col1:
                     if st.button("💾 Save Labels", type="primary"):
-                        # Prepare data for saving
-                        # Merge labeled data with all previously labeled data
-                        if existing_labels is not None:
-                            # Create a composite key for precise duplicate detection
-                            # Remove rows from existing_labels that match current filtered_comments
-                            # based on both text_original AND videoId
-                            existing_labels['_key'] = existing_labels['text_original'] + '|||' + existing_labels['videoId'].astype(str)
-                            filtered_comments['_key'] = filtered_comments['text_original'] + '|||' + filtered_comments['videoId'].astype(str)
-                            
-                            # Keep only existing labels that are not in the current filtered set
-                            other_labels = existing_labels[~existing_labels['_key'].isin(filtered_comments['_key'])].copy()
-                            other_labels = other_labels.drop(columns=['_key'])
-                            
-                            # Remove the temporary key from filtered_comments
-                            filtered_comments = filtered_comments.drop(columns=['_key'])
-                            
-                            # Combine with newly labeled data
-                            all_labeled = pd.concat([other_labels, filtered_comments], ignore_index=True)
-                        else:
-                            all_labeled = filtered_comments
-                        
-                        # Remove rows without labels
-                        all_labeled = all_labeled[all_labeled['label'].notna()]
+                        # Only comments whose label changed are appended to the log;
+                        # a cleared label is logged as empty so it is dropped on load
+                        changed = (
+                            edited['label'].to_numpy(dtype=np.int8, na_value=0)
+                            != labels.to_numpy(dtype=np.int8, na_value=0)
+                        )
+                        delta = filtered_comments.loc[changed].assign(label=edited.loc[changed, 'label'])
                         
-                        # Save to file
-                        if save_labeled_data(all_labeled):
-                            st.success(f"✅ Successfully saved {len(all_labeled)} labeled comments to '{OUTPUT_FILE}'")
+                        if delta.empty:
+                            st.info("ℹ️ No label changes to save")
+                        elif flush_delta(delta):
+                            # Rerun so the table is rebuilt under the new labels mtime
+                            # before the next edit; otherwise that edit would be lost
+                            st.session_state.save_message = f"✅ Successfully saved {len(delta)} label changes"
+                            st.rerun()
                         else:
                             st.error("❌ Failed to save labeled data")
                 
                 with col2:
-                    st.info(f"Labels will be saved to: {OUTPUT_FILE}")
+                    st.info(f"Labels are appended to '{LOG_FILE}' and merged into '{OUTPUT_FILE}' when compacted")
+                    if st.button("📦 Compact to CSV"):
+                        if compact():
+                            st.session_state.save_message = f"✅ Labels written to '{OUTPUT_FILE}'"
+                            st.rerun()
+                        else:
+                            st.error("❌ Failed to compact labeled data")
     
     else:
         # Show instructions when files are not uploaded
@@ -0,0 +1,53 @@
+"""Round-trip checks for the label files written by label_app."""
+
+import pandas as pd
+
+import label_app
+
+
+COMMENTS_CSV = (
+    b"videoId,text_original,publishedAt,likeCount,authorName\n"
+    b"v1,first comment,2025-07-10T06:53:51Z,007,NA\n"
+    b"v1,second comment,2025-07-11T08:00:00Z,,Jane\n"
+)
+
+
+def read_as_text(data) -> pd.DataFrame:
+    return pd.read_csv(data, dtype=str, keep_default_na=False)
+
+
+def test_pass_through_columns_survive_save_and_compact(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    upload = tmp_path / "comments.csv"
+    upload.write_bytes(COMMENTS_CSV)
+
+    comments_df = label_app.load_csv_file(COMMENTS_CSV, "comments.csv", label_app.COMMENTS_DTYPES)
+    comments_df = label_app.merge_with_existing_labels(comments_df, None)
+    comments_df['label'] = pd.array([1, 3], dtype='Int8')
+
+    assert label_app.flush_delta(comments_df)
+    assert label_app.compact()
+
+    original = read_as_text(upload)
+    saved = read_as_text(label_app.OUTPUT_FILE)
+    assert saved.drop(columns='label').equals(original)
+    assert saved['label'].tolist() == ['1', '3']
+
+
+def test_comments_with_the_same_normalized_text_keep_their_labels(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    upload = b'videoId,text_original\nv1,hello\nv1,"hello "\n'
+
+    comments_df = label_app.load_csv_file(upload, "comments.csv", label_app.COMMENTS_DTYPES)
+    comments_df = label_app.merge_with_existing_labels(comments_df, None)
+    comments_df['label'] = pd.array([1, 3], dtype='Int8')
+    assert label_app.flush_delta(comments_df)
+
+    existing_labels = label_app.read_labels_files()
+    reloaded = label_app.merge_with_existing_labels(comments_df.drop(columns='label'), existing_labels)
+    assert reloaded['label'].tolist() == [1, 3]
+
+    assert label_app.compact()
+    saved = read_as_text(label_app.OUTPUT_FILE)
+    assert saved['text_original'].tolist() == ['hello', 'hello ']
+    assert saved['label'].tolist() == ['1', '3']